@@ -0,0 +1,144 @@
+"""
+Benchmark for sending a notification to many recipients.
+
+Compares creating and sending the notifications one at a time using ``notify`` with
+``notify_many``, and rendering the emails for already-created notifications one at a
+time with rendering them using ``notification_contexts``. The time taken and the
+number of database queries are reported for each.
+
+Run it from the root of the repository with::
+
+    python benchmarks/fanout.py --recipients 10000
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+
+def configure(database):
+    """
+    Configure Django with a single SQLite database and the test templates.
+    """
+    settings.configure(
+        INSTALLED_APPS=[
+            "django.contrib.auth",
+            "django.contrib.contenttypes",
+            "polymorphic",
+            "jasmin_notifications",
+        ],
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": database}},
+        TEMPLATES=[
+            {
+                "BACKEND": "django.template.backends.django.DjangoTemplates",
+                "DIRS": [ROOT_DIR / "tests" / "templates"],
+                "APP_DIRS": True,
+            }
+        ],
+        ROOT_URLCONF="tests.urls",
+        DEFAULT_AUTO_FIELD="django.db.models.AutoField",
+        USE_TZ=True,
+        EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+        DEFAULT_FROM_EMAIL="notifications@example.com",
+        BASE_URL="https://example.com",
+    )
+    django.setup()
+
+
+def measure(label, func):
+    """
+    Run ``func`` and print the time taken, queries executed and emails sent.
+    """
+    from django.core import mail
+    from django.db import connection
+
+    mail.outbox = []
+    queries = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+    print(
+        "{:<50} {:>8.2f}s {:>8} queries {:>8} emails".format(
+            label, elapsed, queries, len(mail.outbox)
+        )
+    )
+
+
+def run(recipients):
+    """
+    Create the given number of users and run each of the measurements.
+    """
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    from jasmin_notifications import helpers
+    from jasmin_notifications.models import NotificationType, UserNotification
+
+    call_command("migrate", verbosity=0)
+    notification_type, _ = NotificationType.create("test", level="info")
+    user_model = get_user_model()
+    user_model.objects.bulk_create(
+        user_model(username="user{}".format(i), email="user{}@example.com".format(i))
+        for i in range(recipients)
+    )
+    users = list(user_model.objects.order_by("pk"))
+
+    measure(
+        "notify for each of {} users".format(recipients),
+        lambda: [
+            helpers.notify("test", notification_type, "/one/", user=user, extra="value")
+            for user in users
+        ],
+    )
+    measure(
+        "notify_many for {} users".format(recipients),
+        lambda: helpers.notify_many(
+            "test", notification_type, "/many/", users=users, extra="value"
+        ),
+    )
+
+    notifications = UserNotification.objects.filter(link="/many/")
+    measure(
+        "render {} emails one at a time".format(recipients),
+        lambda: [helpers.notification_email(n) for n in notifications.all()],
+    )
+    measure(
+        "render {} emails with notification_contexts".format(recipients),
+        lambda: [
+            helpers.notification_email(n, context)
+            for n, context in helpers.notification_contexts(notifications.all())
+        ],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--recipients",
+        type=int,
+        default=10000,
+        help="Number of users to notify (default 10000).",
+    )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        configure(pathlib.Path(directory) / "benchmark.sqlite3")
+        run(args.recipients)
+
+
+if __name__ == "__main__":
+    main()
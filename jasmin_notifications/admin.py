@@ -10,7 +10,13 @@ from polymorphic.admin import (
     PolymorphicParentModelAdmin,
 )
 
-from .models import EmailNotification, Notification, NotificationType, UserNotification
+from .models import (
+    ArchivedNotification,
+    EmailNotification,
+    Notification,
+    NotificationType,
+    UserNotification,
+)
 
 
 @admin.register(NotificationType)
@@ -59,3 +65,11 @@ class NotificationAdmin(PolymorphicParentModelAdmin):
         return obj.notification_type.level
 
     level.short_description = "Notification level"
+
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ("notification_type", "user", "email", "uuid", "created_at", "archived_at")
+    list_filter = ("notification_type",)
+    list_select_related = ("notification_type", "user")
+    search_fields = ("notification_type__name", "uuid", "link", "user__username", "email")
@@ -5,16 +5,64 @@ Module containing helper functions for the JASMIN notifications app.
 __author__ = "Matt Pryor"
 __copyright__ = "Copyright 2015 UK Science and Technology Facilities Council"
 
+import logging
 from datetime import date
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import router, transaction
+from django.db.models import F
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import EmailNotification, NotificationType, UserNotification
+from .models import (
+    EmailNotification,
+    Notification,
+    NotificationType,
+    UnreadNotificationCount,
+    UserNotification,
+)
 
+_log = logging.getLogger(__name__)
 
-def notification_context(notification):
+
+def shared_notification_context(notification):
+    """
+    Returns the part of the template context for ``notification`` that does not
+    depend on the recipient, i.e. ``notification_type``, ``level``, ``target`` and
+    ``link``.
+
+    This is the same for all notifications with the same type, target and link, so
+    it can be computed once and reused for each recipient of a fan-out.
+    """
+    link_prefix = "" if notification.link.startswith("http") else settings.BASE_URL
+    return {
+        "notification_type": notification.notification_type.name,
+        "level": notification.notification_type.level,
+        "target": notification.target,
+        "link": link_prefix + notification.link,
+    }
+
+
+def notification_recipient(notification):
+    """
+    Returns a ``(user, email)`` tuple for the recipient of a notification.
+
+    For email notifications, ``user`` is the user with the email address, or ``None``
+    if there is no such user.
+    """
+    if isinstance(notification, UserNotification):
+        return notification.user, notification.user.email
+    else:
+        # For email notifications, try to find a user with the email address to go
+        # into the context
+        email = notification.email
+        return get_user_model().objects.filter(email=email).first(), email
+
+
+def notification_context(notification, shared_context=None, recipient=None):
     """
     Takes a notification and returns a template context dictionary for that notification.
 
@@ -32,33 +80,154 @@ def notification_context(notification):
       * ``followed_at`` - the datetime at which the notification was followed, or
                           ``None`` if it has not been followed
       * Any variables specified as ``extra_context``
+
+    ``shared_context`` and ``recipient`` can be given to avoid recomputing them, see
+    :py:func:`shared_notification_context` and :py:func:`notification_recipient`.
     """
-    if isinstance(notification, UserNotification):
-        user = notification.user
-        email = user.email
-    else:
-        # For email notifications, try to find a user with the email address to go
-        # into the context
-        email = notification.email
-        user = get_user_model().objects.filter(email=email).first()
+    if shared_context is None:
+        shared_context = shared_notification_context(notification)
+    user, email = recipient or notification_recipient(notification)
     # Create the context
-    link_prefix = "" if notification.link.startswith("http") else settings.BASE_URL
-    context = {
-        "notification_type": notification.notification_type.name,
-        "level": notification.notification_type.level,
-        "email": email,
-        "user": user,
-        "target": notification.target,
-        "link": link_prefix + notification.link,
-        "follow_link": settings.BASE_URL
+    context = dict(
+        shared_context,
+        email=email,
+        user=user,
+        follow_link=settings.BASE_URL
         + reverse("jasmin_notifications:follow", kwargs={"uuid": notification.uuid}),
-        "created_at": notification.created_at,
-        "followed_at": notification.followed_at,
-    }
+        created_at=notification.created_at,
+        followed_at=notification.followed_at,
+    )
     context.update(notification.extra_context)
     return context
 
 
+def notification_email(notification, context=None):
+    """
+    Builds the email message for a notification.
+
+    The templates at ``jasmin_notifications/mail/{type}/{subject|content}.txt`` are
+    rendered for the email subject and body. If ``context`` is not given, it is
+    computed using :py:func:`notification_context`.
+
+    The email is always sent to the notification's recipient, regardless of any
+    ``email`` in the context.
+    """
+    if isinstance(notification, UserNotification):
+        email = notification.user.email
+    else:
+        email = notification.email
+    if context is None:
+        context = notification_context(notification)
+    template_dir = "jasmin_notifications/mail/{}".format(notification.notification_type.name)
+    subject = render_to_string("{}/subject.txt".format(template_dir), context)
+    subject = (settings.EMAIL_SUBJECT_PREFIX + subject).strip()
+    content = render_to_string("{}/content.txt".format(template_dir), context)
+    return EmailMessage(
+        subject=subject,
+        body=content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+        cc=(
+            [notification.cc]
+            if isinstance(notification, EmailNotification) and notification.cc
+            else []
+        ),
+    )
+
+
+def notification_contexts(notifications):
+    """
+    Returns a list of ``(notification, context)`` pairs for the given notifications.
+
+    Notification types and recipients are fetched in bulk, and notifications with the
+    same type, target, link and extra context share a single
+    :py:func:`shared_notification_context`, so each target is only resolved once.
+    """
+    notifications = list(notifications)
+    types = NotificationType.objects.in_bulk({n.notification_type_id for n in notifications})
+    user_model = get_user_model()
+    users = user_model.objects.in_bulk(
+        {n.user_id for n in notifications if isinstance(n, UserNotification)}
+    )
+    users_by_email = {}
+    emails = {n.email for n in notifications if not isinstance(n, UserNotification)}
+    if emails:
+        for user in user_model.objects.filter(email__in=emails).order_by("pk"):
+            users_by_email.setdefault(user.email, user)
+    shared_contexts = {}
+    contexts = []
+    for notification in notifications:
+        notification.notification_type = types[notification.notification_type_id]
+        if isinstance(notification, UserNotification):
+            notification.user = users[notification.user_id]
+            recipient = (notification.user, notification.user.email)
+        else:
+            recipient = (users_by_email.get(notification.email), notification.email)
+        # Extra context is not hashable, so compare it within each group
+        key = (
+            notification.notification_type_id,
+            notification.target_ctype_id,
+            notification.target_id,
+            notification.link,
+        )
+        group = shared_contexts.setdefault(key, [])
+        for extra_context, shared_context in group:
+            if extra_context == notification.extra_context:
+                break
+        else:
+            shared_context = shared_notification_context(notification)
+            group.append((notification.extra_context, shared_context))
+        contexts.append(
+            (notification, notification_context(notification, shared_context, recipient))
+        )
+    return contexts
+
+
+def send_notification_emails(notifications, connection=None):
+    """
+    Sends the emails for the given notifications over a single mail connection and
+    records the results on the notifications.
+
+    Contexts are computed using :py:func:`notification_contexts`. Returns a tuple of
+    the number of emails sent and failed.
+    """
+    if connection is None:
+        with get_connection(fail_silently=True) as connection:
+            return send_notification_emails(notifications, connection)
+    delivered = []
+    undelivered = []
+    for notification, context in notification_contexts(notifications):
+        message = notification_email(notification, context)
+        if connection.send_messages([message]):
+            delivered.append(notification.pk)
+        else:
+            _log.error("Failed to send notification (uuid: {})".format(notification.uuid))
+            undelivered.append(notification.pk)
+    queryset = Notification.objects.non_polymorphic()
+    if delivered:
+        queryset.filter(pk__in=delivered).update(delivered_at=timezone.now())
+    if undelivered:
+        queryset.filter(pk__in=undelivered).update(delivery_attempts=F("delivery_attempts") + 1)
+    return len(delivered), len(undelivered)
+
+
+def render_message(notification, context=None):
+    """
+    Renders the on-site message for a notification using the template at
+    ``jasmin_notifications/messages/{type}.html``.
+
+    If ``context`` is not given, it is computed using :py:func:`notification_context`.
+    As in the notification dropdown, it is available to the template as
+    ``notification``.
+    """
+    if context is None:
+        context = notification_context(notification)
+    return render_to_string(
+        "jasmin_notifications/messages/{}.html".format(notification.notification_type.name),
+        {"notification": context},
+    )
+
+
 def notify(notification_type, target, link, user=None, email=None, cc=None, **extra_context):
     """
     Creates a notification with the given ``notification_type``, ``target`` and ``link``.
@@ -71,6 +240,11 @@ def notify(notification_type, target, link, user=None, email=None, cc=None, **ex
 
     Any additional ``kwargs`` are based as context variables for template rendering,
     both for emails and messages (if appropriate).
+
+    If the ``JASMIN_NOTIFICATIONS_PRERENDER_MESSAGES`` setting is ``True``, the
+    on-site message for displayable user notifications is rendered once here and
+    stored on the notification. The user's unread count is updated in the same
+    transaction as the notification is created.
     """
     if not isinstance(notification_type, NotificationType):
         notification_type = NotificationType.objects.get(name=notification_type)
@@ -84,7 +258,66 @@ def notify(notification_type, target, link, user=None, email=None, cc=None, **ex
     notification.target = target
     notification.link = link
     notification.extra_context = extra_context
-    notification.save()
+    with transaction.atomic():
+        notification.save()
+        if user and notification_type.display:
+            if getattr(settings, "JASMIN_NOTIFICATIONS_PRERENDER_MESSAGES", False):
+                notification.message = render_message(notification)
+                Notification.objects.filter(pk=notification.pk).update(message=notification.message)
+            UnreadNotificationCount.adjust(user, 1)
+
+
+def notify_many(notification_type, target, link, users=(), emails=(), cc=None, **extra_context):
+    """
+    Creates notifications with the same ``notification_type``, ``target``, ``link``
+    and extra context for many recipients.
+
+    A :py:class:`~.models.UserNotification` is created for each of ``users`` and an
+    :py:class:`~.models.EmailNotification` for each of ``emails``. The part of the
+    template context that is the same for every recipient is computed once, and
+    the emails are sent over a single mail connection once the transaction that
+    created the notifications commits.
+
+    See :py:func:`notify` for more details. Returns the created notifications.
+    """
+    if not isinstance(notification_type, NotificationType):
+        notification_type = NotificationType.objects.get(name=notification_type)
+    notifications = [UserNotification(user=user) for user in users]
+    notifications.extend(EmailNotification(email=email, cc=cc) for email in emails)
+    prerender = notification_type.display and getattr(
+        settings, "JASMIN_NOTIFICATIONS_PRERENDER_MESSAGES", False
+    )
+    with transaction.atomic():
+        shared_context = None
+        rendered = []
+        for notification in notifications:
+            notification.notification_type = notification_type
+            notification.target = target
+            notification.link = link
+            notification.extra_context = extra_context
+            # The emails are sent together below
+            notification._defer_delivery = True
+            notification.save()
+            if isinstance(notification, UserNotification) and notification_type.display:
+                if prerender:
+                    if shared_context is None:
+                        shared_context = shared_notification_context(notification)
+                    notification.message = render_message(
+                        notification,
+                        notification_context(
+                            notification,
+                            shared_context,
+                            (notification.user, notification.user.email),
+                        ),
+                    )
+                    rendered.append(notification)
+                UnreadNotificationCount.adjust(notification.user, 1)
+        if rendered:
+            Notification.objects.bulk_update(rendered, ["message"])
+        if not getattr(settings, "JASMIN_NOTIFICATIONS_DEFERRED_DELIVERY", False):
+            # As for notify, the emails are only sent once the notifications are committed
+            transaction.on_commit(lambda: send_notification_emails(notifications))
+    return notifications
 
 
 def notify_if_not_exists(notification_type, target, link, user=None, email=None, **extra_context):
@@ -94,10 +327,13 @@ def notify_if_not_exists(notification_type, target, link, user=None, email=None,
 
     See :py:func:`notify` for more details.
     """
+    # Check against the primary database, so that recent notifications are not repeated
     if user:
-        query = UserNotification.objects.filter(user=user)
+        query = UserNotification.objects.using(router.db_for_write(UserNotification))
+        query = query.filter(user=user)
     elif email:
-        query = EmailNotification.objects.filter(email=email)
+        query = EmailNotification.objects.using(router.db_for_write(EmailNotification))
+        query = query.filter(email=email)
     else:
         raise ValueError("One of user or email must be given")
     if not query.filter_type(notification_type).filter_target(target).exists():
@@ -122,10 +358,13 @@ def notify_pending_deadline(
     if deadline < today:
         return
     # Work out whether we are using email or user notifications
+    # The primary database is used, so that recent notifications are not repeated
     if user:
-        query = UserNotification.objects.filter(user=user)
+        query = UserNotification.objects.using(router.db_for_write(UserNotification))
+        query = query.filter(user=user)
     elif email:
-        query = EmailNotification.objects.filter(email=email)
+        query = EmailNotification.objects.using(router.db_for_write(EmailNotification))
+        query = query.filter(email=email)
     else:
         raise ValueError("One of user or email must be given")
     # Find the most recent notification for the type/target/recipient combo
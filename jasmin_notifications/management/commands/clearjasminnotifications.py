@@ -2,6 +2,8 @@ import datetime
 
 import django.core.management.base
 import django.utils
+from django.db import connections, router, transaction
+from django.db.models import Q
 
 from ... import models
 
@@ -18,16 +20,128 @@ class Command(django.core.management.base.BaseCommand):
             days=1826
         )  # 5 years.
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--archive",
+            action="store_true",
+            help="Move old notifications into the archive table before cleaning up.",
+        )
+        parser.add_argument(
+            "--archive-days",
+            type=int,
+            default=90,
+            help="Archive notifications followed, or created but not waiting to be read on "
+            "site, more than this many days ago (default 90).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of notifications to archive per transaction (default 1000).",
+        )
+
     def handle(self, *args, **options):
         """Delete old notifications."""
-        old_followed_notifications = models.Notification.objects.filter(
+        if options["archive"]:
+            cutoff = django.utils.timezone.now() - datetime.timedelta(days=options["archive_days"])
+            archived = self.archive(cutoff, options["batch_size"])
+            self.stdout.write("Archived {} notifications".format(archived))
+            self.clean_archive()
+
+        # Pick the notifications to delete on the database they are deleted from
+        notifications = models.Notification.objects.using(router.db_for_write(models.Notification))
+        old_followed_notifications = notifications.filter(
             followed_at__isnull=False, followed_at__lt=self.clean_followed
         )[:100]
         if old_followed_notifications:
             old_followed_notifications.delete()
 
-        old_notifications = models.Notification.objects.filter(
-            created_at__lt=self.clean_unfollowed
-        )[:100]
+        old_notifications = notifications.filter(created_at__lt=self.clean_unfollowed)[:100]
         if old_notifications:
             old_notifications.delete()
+
+    def archive(self, cutoff, batch_size):
+        """
+        Move old notifications into the archive table.
+
+        Notifications followed before ``cutoff`` are archived, as are notifications
+        created before ``cutoff`` that are not displayed on site, i.e. email
+        notifications and user notifications of types that are not displayed.
+        Unread notifications that are displayed on site are never archived.
+
+        Each batch is copied with a single ``INSERT ... SELECT`` and removed from the
+        live tables with one ``DELETE`` per table, so no model instances are loaded.
+        """
+        using = router.db_for_write(models.Notification)
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        archive = qn(models.ArchivedNotification._meta.db_table)
+        notification = qn(models.Notification._meta.db_table)
+        user_notification = qn(models.UserNotification._meta.db_table)
+        email_notification = qn(models.EmailNotification._meta.db_table)
+        insert_sql = (
+            "INSERT INTO {archive} "
+            "(uuid, notification_type_id, target_ctype_id, target_id, link, "
+            "user_id, email, created_at, followed_at, archived_at) "
+            "SELECT n.uuid, n.notification_type_id, n.target_ctype_id, n.target_id, n.link, "
+            "u.user_id, e.email, n.created_at, n.followed_at, %s "
+            "FROM {notification} n "
+            "LEFT JOIN {user_notification} u ON u.notification_ptr_id = n.id "
+            "LEFT JOIN {email_notification} e ON e.notification_ptr_id = n.id "
+            "WHERE n.id IN ({ids})"
+        )
+        archived = 0
+        while True:
+            with transaction.atomic(using=using):
+                ids = list(
+                    models.Notification.objects.using(using)
+                    .non_polymorphic()
+                    .filter(
+                        Q(followed_at__lt=cutoff)
+                        | Q(created_at__lt=cutoff)
+                        & (Q(usernotification__isnull=True) | Q(notification_type__display=False))
+                    )
+                    .order_by("id")
+                    .values_list("id", flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                placeholders = ", ".join(["%s"] * len(ids))
+                archived_at = connection.ops.adapt_datetimefield_value(django.utils.timezone.now())
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        insert_sql.format(
+                            archive=archive,
+                            notification=notification,
+                            user_notification=user_notification,
+                            email_notification=email_notification,
+                            ids=placeholders,
+                        ),
+                        [archived_at, *ids],
+                    )
+                    for table, column in [
+                        (user_notification, "notification_ptr_id"),
+                        (email_notification, "notification_ptr_id"),
+                        (notification, "id"),
+                    ]:
+                        cursor.execute(
+                            "DELETE FROM {} WHERE {} IN ({})".format(table, column, placeholders),
+                            ids,
+                        )
+            archived += len(ids)
+        return archived
+
+    def clean_archive(self):
+        """Apply the same retention periods to the archive table as to live notifications."""
+        using = router.db_for_write(models.ArchivedNotification)
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM {} WHERE followed_at < %s OR created_at < %s".format(
+                    connection.ops.quote_name(models.ArchivedNotification._meta.db_table)
+                ),
+                [
+                    connection.ops.adapt_datetimefield_value(self.clean_followed),
+                    connection.ops.adapt_datetimefield_value(self.clean_unfollowed),
+                ],
+            )
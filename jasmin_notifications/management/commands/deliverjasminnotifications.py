@@ -0,0 +1,133 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import django.core.management.base
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ... import helpers, models
+
+
+class Command(django.core.management.base.BaseCommand):
+    """Management command to send undelivered JASMIN notification emails."""
+
+    help = "Send undelivered JASMIN notification emails using a pool of workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker threads, each with its own mail connection (default 1).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Number of notifications each worker claims at a time (default 50).",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Stop retrying a notification after this many failures (default 5).",
+        )
+        parser.add_argument(
+            "--grace-seconds",
+            type=int,
+            default=300,
+            help="Unless deferred delivery is enabled, skip notifications that have never "
+            "been attempted and are younger than this, as they may still be being sent "
+            "when they are created (default 300).",
+        )
+
+    def handle(self, *args, **options):
+        """Run the workers until there are no more notifications to claim."""
+        using = router.db_for_write(models.Notification)
+        workers = options["workers"]
+        if workers > 1 and not connections[using].features.has_select_for_update_skip_locked:
+            raise django.core.management.base.CommandError(
+                "Multiple workers require a database that supports "
+                "SELECT ... FOR UPDATE SKIP LOCKED"
+            )
+        claimable = self.claimable(options["max_attempts"], options["grace_seconds"])
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self.work, using, options["batch_size"], claimable)
+                for _ in range(workers)
+            ]
+            results = [future.result() for future in futures]
+        self.stdout.write(
+            "Sent {} notifications, {} failed".format(
+                sum(sent for sent, _ in results), sum(failed for _, failed in results)
+            )
+        )
+
+    def claimable(self, max_attempts, grace_seconds):
+        """
+        Returns a filter for the notifications that workers may claim.
+        """
+        claimable = Q(delivered_at__isnull=True, delivery_attempts__lt=max_attempts)
+        if not getattr(settings, "JASMIN_NOTIFICATIONS_DEFERRED_DELIVERY", False):
+            # Notifications are also sent when they are created, so only pick up those
+            # that have already failed or whose initial send must have been lost
+            claimable &= Q(delivery_attempts__gt=0) | Q(
+                created_at__lt=timezone.now() - datetime.timedelta(seconds=grace_seconds)
+            )
+        return claimable
+
+    def work(self, using, batch_size, claimable):
+        """
+        Claim and deliver batches of notifications until there are none left.
+
+        Returns a tuple of the number of notifications sent and failed.
+        """
+        sent = failed = 0
+        try:
+            # Each worker keeps a single mail connection open for all its batches
+            with get_connection(fail_silently=True) as mail_connection:
+                while True:
+                    result = self.deliver_batch(using, mail_connection, batch_size, claimable)
+                    if result is None:
+                        break
+                    sent += result[0]
+                    failed += result[1]
+                    # If nothing in the batch could be sent, the mail server is probably
+                    # unavailable so leave the remaining notifications for the next run
+                    if not result[0]:
+                        break
+        finally:
+            # Database connections are per-thread, so close this worker's connections
+            connections.close_all()
+        return sent, failed
+
+    def deliver_batch(self, using, mail_connection, batch_size, claimable):
+        """
+        Claim a batch of undelivered notifications matching ``claimable``, send them
+        and record the results.
+
+        The rows stay locked until the results are recorded, and rows locked by other
+        workers are skipped, so a notification is never sent by two workers.
+
+        Returns a tuple of the number of notifications sent and failed, or ``None``
+        if there was nothing to claim.
+        """
+        with transaction.atomic(using=using):
+            ids = list(
+                models.Notification.objects.using(using)
+                .non_polymorphic()
+                .select_for_update(skip_locked=True)
+                .filter(claimable)
+                # Notifications that have failed before go to the back of the queue
+                .order_by("delivery_attempts", "id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return None
+            # Notifications from the same fan-out share their rendering context
+            return helpers.send_notification_emails(
+                models.Notification.objects.using(using).filter(pk__in=ids), mail_connection
+            )
@@ -0,0 +1,219 @@
+import argparse
+import csv
+import datetime
+import itertools
+import json
+
+import django.core.management.base
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import dateparse, timezone
+
+from ... import models
+
+#: The exported columns, mapped to the lookups used to fetch them
+COLUMNS = {
+    "uuid": "uuid",
+    "notification_type": "notification_type__name",
+    "level": "notification_type__level",
+    "user": "usernotification__user__username",
+    "email": "emailnotification__email",
+    "cc": "emailnotification__cc",
+    "target_type": "target_ctype__model",
+    "target_id": "target_id",
+    "link": "link",
+    "created_at": "created_at",
+    "followed_at": "followed_at",
+    "delivered_at": "delivered_at",
+    "archived_at": None,
+}
+
+#: The lookups used to fetch the exported columns for archived notifications
+#: Columns that are not kept in the archive are exported as empty
+ARCHIVED_COLUMNS = dict(
+    COLUMNS,
+    user="user__username",
+    email="email",
+    cc=None,
+    delivered_at=None,
+    archived_at="archived_at",
+)
+
+
+def datetime_argument(value):
+    """Parses a command line argument as a date or datetime."""
+    parsed = dateparse.parse_datetime(value)
+    if parsed is None:
+        date = dateparse.parse_date(value)
+        if date is None:
+            raise argparse.ArgumentTypeError("{} is not a valid date or datetime".format(value))
+        parsed = datetime.datetime.combine(date, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(django.core.management.base.BaseCommand):
+    """Management command to export JASMIN notifications."""
+
+    help = "Export JASMIN notifications as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only export notifications for this username.")
+        parser.add_argument(
+            "--email",
+            help="Only export notifications sent to this email, directly or via a user.",
+        )
+        parser.add_argument(
+            "--target",
+            help="Only export notifications for this target, as app_label.model:pk.",
+        )
+        parser.add_argument(
+            "--type", dest="notification_type", help="Only export notifications of this type."
+        )
+        parser.add_argument(
+            "--since",
+            type=datetime_argument,
+            help="Only export notifications created at or after this date or datetime.",
+        )
+        parser.add_argument(
+            "--until",
+            type=datetime_argument,
+            help="Only export notifications created before this date or datetime.",
+        )
+        parser.add_argument(
+            "--format", choices=["csv", "jsonl"], default="csv", help="Output format (default csv)."
+        )
+        parser.add_argument(
+            "--exclude-archived",
+            action="store_true",
+            help="Do not export notifications that have been moved to the archive table.",
+        )
+        parser.add_argument("--output", help="File to write to (default stdout).")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of rows to fetch from the database at a time (default 2000).",
+        )
+
+    def handle(self, *args, **options):
+        """Stream the matching notifications to the output."""
+        chunk_size = options["chunk_size"]
+        rows = self.rows(
+            self.get_queryset(options).iterator(chunk_size=chunk_size),
+            COLUMNS,
+            "usernotification__user__email",
+        )
+        if not options["exclude_archived"]:
+            # Archived notifications follow the live ones
+            rows = itertools.chain(
+                rows,
+                self.rows(
+                    self.get_archived_queryset(options).iterator(chunk_size=chunk_size),
+                    ARCHIVED_COLUMNS,
+                    "user__email",
+                ),
+            )
+        if options["output"]:
+            with open(options["output"], "w", newline="") as stream:
+                self.write(stream, rows, options["format"])
+        else:
+            self.write(self.stdout, rows, options["format"])
+
+    def get_queryset(self, options):
+        """Returns a values queryset for the notifications selected by the options."""
+        notifications = models.Notification.objects.non_polymorphic()
+        notifications = self.apply_filters(
+            notifications,
+            options,
+            "usernotification__user",
+            Q(emailnotification__email=options["email"]),
+        )
+        # Only the exported columns are fetched, so no instances are built and
+        # extra_context is never unpickled
+        return notifications.order_by("id").values(
+            *filter(None, COLUMNS.values()),
+            "target_ctype__app_label",
+            "usernotification__user__email",
+        )
+
+    def get_archived_queryset(self, options):
+        """
+        Returns a values queryset for the archived notifications selected by the options.
+        """
+        notifications = self.apply_filters(
+            models.ArchivedNotification.objects.all(),
+            options,
+            "user",
+            Q(email=options["email"]),
+        )
+        return notifications.order_by("id").values(
+            *filter(None, ARCHIVED_COLUMNS.values()), "target_ctype__app_label", "user__email"
+        )
+
+    def apply_filters(self, notifications, options, user_lookup, email_q):
+        """
+        Applies the filters selected by the options to a queryset of live or archived
+        notifications.
+
+        ``user_lookup`` is the lookup for the notified user and ``email_q`` matches
+        notifications sent directly to the selected email.
+        """
+        if options["user"]:
+            notifications = notifications.filter(
+                **{"{}__username".format(user_lookup): options["user"]}
+            )
+        if options["email"]:
+            notifications = notifications.filter(
+                Q(**{"{}__email".format(user_lookup): options["email"]}) | email_q
+            )
+        if options["target"]:
+            model, _, pk = options["target"].partition(":")
+            app_label, _, model_name = model.partition(".")
+            try:
+                ctype = ContentType.objects.get_by_natural_key(app_label, model_name.lower())
+            except ContentType.DoesNotExist:
+                raise django.core.management.base.CommandError(
+                    "Unknown target type {}".format(model)
+                )
+            notifications = notifications.filter(target_ctype=ctype, target_id=pk)
+        if options["notification_type"]:
+            notifications = notifications.filter(
+                notification_type__name=options["notification_type"]
+            )
+        if options["since"]:
+            notifications = notifications.filter(created_at__gte=options["since"])
+        if options["until"]:
+            notifications = notifications.filter(created_at__lt=options["until"])
+        return notifications
+
+    def rows(self, values, columns, user_email_lookup):
+        """
+        Converts rows from a values queryset into export rows.
+
+        ``columns`` maps the exported columns to the lookups in the values and
+        ``user_email_lookup`` is the lookup for the notified user's email.
+        """
+        for value in values:
+            row = {column: value[lookup] if lookup else None for column, lookup in columns.items()}
+            row["target_type"] = "{}.{}".format(
+                value["target_ctype__app_label"], row["target_type"]
+            )
+            row["email"] = value[user_email_lookup] or row["email"]
+            # Datetimes are written in full in both formats
+            for column, field in row.items():
+                if isinstance(field, datetime.datetime):
+                    row[column] = field.isoformat()
+            yield row
+
+    def write(self, stream, rows, output_format):
+        """Writes the rows to the stream in the given format."""
+        if output_format == "csv":
+            writer = csv.DictWriter(stream, fieldnames=list(COLUMNS), lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                stream.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
@@ -0,0 +1,84 @@
+import django.core.management.base
+from django.db import connections, router, transaction
+from django.db.models import Case, Value, When
+
+from ... import models
+
+
+class Command(django.core.management.base.BaseCommand):
+    """Management command to apply buffered JASMIN notification follows."""
+
+    help = "Apply buffered follows to JASMIN notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of buffered follows to apply per transaction (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        """Apply buffered follows in batches until the buffer is empty."""
+        flushed = 0
+        while True:
+            count = self.flush_batch(options["batch_size"])
+            if not count:
+                break
+            flushed += count
+        self.stdout.write("Applied {} buffered follows".format(flushed))
+
+    def flush_batch(self, batch_size):
+        """
+        Apply a single batch of buffered follows and remove them from the buffer.
+
+        Follows of user notifications are coalesced so that each user and link is
+        updated with a single query, using the latest follow time. Only notifications
+        that existed at that time are marked as followed. Follows of email
+        notifications are applied with a single query for the whole batch.
+        """
+        using = router.db_for_write(models.PendingFollow)
+        with transaction.atomic(using=using):
+            follows = list(models.PendingFollow.objects.using(using).order_by("id")[:batch_size])
+            if not follows:
+                return 0
+            user_follows = {}
+            email_follows = {}
+            for follow in follows:
+                if follow.user_id:
+                    key = (follow.user_id, follow.link)
+                    user_follows[key] = max(
+                        follow.followed_at, user_follows.get(key, follow.followed_at)
+                    )
+                else:
+                    key = follow.notification_id
+                    email_follows[key] = min(
+                        follow.followed_at, email_follows.get(key, follow.followed_at)
+                    )
+            for (user_id, link), followed_at in user_follows.items():
+                # Notifications created after the last click were never seen as followed
+                models.UserNotification.objects.using(using).filter(
+                    link=link, user_id=user_id, created_at__lte=followed_at
+                ).mark_followed(user_id, followed_at)
+            if email_follows:
+                models.Notification.objects.using(using).non_polymorphic().filter(
+                    pk__in=email_follows.keys(), followed_at__isnull=True
+                ).update(
+                    followed_at=Case(
+                        *[
+                            When(pk=pk, then=Value(followed_at))
+                            for pk, followed_at in email_follows.items()
+                        ]
+                    )
+                )
+            # Delete the applied follows directly, as the buffer has no dependents
+            connection = connections[using]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM {} WHERE id IN ({})".format(
+                        connection.ops.quote_name(models.PendingFollow._meta.db_table),
+                        ", ".join(["%s"] * len(follows)),
+                    ),
+                    [follow.pk for follow in follows],
+                )
+        return len(follows)
@@ -0,0 +1,56 @@
+import django.core.management.base
+from django.db import router, transaction
+from django.db.models import Count
+
+from ... import models
+
+
+class Command(django.core.management.base.BaseCommand):
+    """Management command to recompute JASMIN notification unread counts."""
+
+    help = "Recompute the unread counts for JASMIN notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of counts to write per query (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        """Recompute the counts for all users in bulk."""
+        using = router.db_for_write(models.UnreadNotificationCount)
+        unread = models.UnreadNotificationCount.unread_notifications().using(using)
+        counts = (
+            unread.order_by()
+            .values_list("user")
+            .annotate(count=Count("pk"))
+            .iterator(chunk_size=options["batch_size"])
+        )
+        batch_size = options["batch_size"]
+        updated = 0
+        with transaction.atomic(using=using):
+            batch = []
+            for user_id, count in counts:
+                batch.append(models.UnreadNotificationCount(user_id=user_id, count=count))
+                if len(batch) >= batch_size:
+                    updated += self.save_batch(using, batch)
+            updated += self.save_batch(using, batch)
+            # Any users with a count but no unread notifications go to zero
+            zeroed = (
+                models.UnreadNotificationCount.objects.using(using)
+                .exclude(count=0)
+                .exclude(user__in=unread.values("user"))
+                .update(count=0)
+            )
+        self.stdout.write("Updated {} unread counts, reset {} to zero".format(updated, zeroed))
+
+    def save_batch(self, using, batch):
+        """Insert or update the counts in the batch and empty it."""
+        models.UnreadNotificationCount.objects.using(using).bulk_create(
+            batch, update_conflicts=True, unique_fields=["user"], update_fields=["count"]
+        )
+        count = len(batch)
+        batch.clear()
+        return count
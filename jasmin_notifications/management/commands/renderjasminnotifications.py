@@ -0,0 +1,79 @@
+import django.core.management.base
+from django.db import router
+
+from ... import helpers, models
+
+
+class Command(django.core.management.base.BaseCommand):
+    """Management command to re-render stored JASMIN notification messages."""
+
+    help = "Re-render the stored on-site messages for JASMIN notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            dest="notification_type",
+            help="Only re-render notifications of this type.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render followed notifications as well as unread ones.",
+        )
+        parser.add_argument(
+            "--unrendered",
+            action="store_true",
+            help="Also render notifications whose messages were not pre-rendered.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Remove the stored messages instead, so that messages are rendered when "
+            "displayed, e.g. after turning pre-rendering off.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of notifications to update per query (default 500).",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Render and store the message for each matching notification.
+
+        By default, only notifications that already have a stored message are
+        re-rendered.
+        """
+        notifications = (
+            models.UserNotification.objects.using(router.db_for_write(models.UserNotification))
+            .filter(notification_type__display=True)
+            .select_related("notification_type")
+        )
+        if options["notification_type"]:
+            notifications = notifications.filter_type(options["notification_type"])
+        if not options["all"]:
+            notifications = notifications.filter(followed_at__isnull=True)
+        if options["clear"]:
+            cleared = notifications.filter(message__isnull=False).update(message=None)
+            self.stdout.write("Cleared {} notification messages".format(cleared))
+            return
+        if not options["unrendered"]:
+            notifications = notifications.filter(message__isnull=False)
+        batch_size = options["batch_size"]
+        batch = []
+        rendered = 0
+        for notification in notifications.iterator(chunk_size=batch_size):
+            notification.message = helpers.render_message(notification)
+            batch.append(notification)
+            if len(batch) >= batch_size:
+                rendered += self.save_batch(batch)
+        rendered += self.save_batch(batch)
+        self.stdout.write("Rendered {} notification messages".format(rendered))
+
+    def save_batch(self, batch):
+        """Store the rendered messages for the batch and empty it."""
+        models.Notification.objects.bulk_update(batch, ["message"])
+        count = len(batch)
+        batch.clear()
+        return count
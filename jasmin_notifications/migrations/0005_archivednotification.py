@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("jasmin_notifications", "0001_squashed_0004_alter_notificationtype_level"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedNotification",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("uuid", models.UUIDField(editable=False, unique=True)),
+                ("target_id", models.CharField(max_length=250)),
+                ("link", models.URLField()),
+                ("email", models.EmailField(blank=True, max_length=254, null=True)),
+                ("created_at", models.DateTimeField()),
+                ("followed_at", models.DateTimeField(blank=True, null=True)),
+                ("archived_at", models.DateTimeField()),
+                (
+                    "notification_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="jasmin_notifications.notificationtype",
+                    ),
+                ),
+                (
+                    "target_ctype",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="contenttypes.contenttype"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "get_latest_by": "created_at",
+                "indexes": [
+                    models.Index(fields=["created_at"], name="jasmin_noti_created_348bcd_idx")
+                ],
+            },
+        ),
+    ]
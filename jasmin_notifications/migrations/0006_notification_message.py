@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jasmin_notifications", "0005_archivednotification"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="message",
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+def mark_existing_delivered(apps, schema_editor):
+    # Notifications that already exist were sent when they were created
+    Notification = apps.get_model("jasmin_notifications", "Notification")
+    Notification.objects.using(schema_editor.connection.alias).update(
+        delivered_at=models.F("created_at")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jasmin_notifications", "0008_unreadnotificationcount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="delivered_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="delivery_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_existing_delivered, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("delivered_at__isnull", True)),
+                fields=["id"],
+                name="jasmin_notif_undelivered_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jasmin_notifications", "0009_notification_delivery"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="archivednotification",
+            index=models.Index(
+                fields=["target_ctype", "target_id"], name="jasmin_noti_target__bab8e1_idx"
+            ),
+        ),
+    ]
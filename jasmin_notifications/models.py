@@ -10,8 +10,9 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, router, transaction
 from django.template.loader import TemplateDoesNotExist, get_template
+from django.utils import timezone
 from picklefield.fields import PickledObjectField
 from polymorphic.models import PolymorphicModel
 from polymorphic.query import PolymorphicQuerySet
@@ -101,10 +102,31 @@ class NotificationQuerySet(PolymorphicQuerySet):
             notification_type = NotificationType.objects.get(name=notification_type)
         return self.filter(notification_type=notification_type)
 
+    def mark_followed(self, user, followed_at):
+        """
+        Marks the unread notifications in this queryset, which must all be for
+        ``user``, as followed at ``followed_at``.
+
+        The user's :py:class:`UnreadNotificationCount` is kept up to date in the same
+        transaction. Returns the number of notifications that were updated.
+        """
+        unread = self.filter(followed_at__isnull=True)
+        if not getattr(settings, "JASMIN_NOTIFICATIONS_UNREAD_COUNTER", False):
+            return unread.update(followed_at=followed_at)
+        with transaction.atomic(using=self._db or router.db_for_write(self.model)):
+            displayed = unread.filter(notification_type__display=True).update(
+                followed_at=followed_at
+            )
+            hidden = unread.update(followed_at=followed_at)
+            UnreadNotificationCount.adjust(user, -displayed)
+        return displayed + hidden
+
     def delete(self, *args, **kwargs):
         # The default here raises an integrity error as the child entries are not
         # removed first
-        for n in self:
+        # The notifications to delete are found on the database they will be deleted
+        # from, rather than a read replica
+        for n in self.using(self._db or router.db_for_write(self.model)):
             n.delete()
 
 
@@ -117,6 +139,13 @@ class Notification(PolymorphicModel):
 
     class Meta:
         get_latest_by = "created_at"
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(delivered_at__isnull=True),
+                name="jasmin_notif_undelivered_idx",
+            )
+        ]
 
     objects = NotificationQuerySet.as_manager()
 
@@ -138,6 +167,12 @@ class Notification(PolymorphicModel):
     followed_at = models.DateTimeField(null=True, blank=True)
     #: Any extra context for template rendering
     extra_context = PickledObjectField(default=dict)
+    #: The pre-rendered on-site message, if messages are rendered at creation time
+    message = models.TextField(null=True, blank=True, editable=False)
+    #: Datetime at which the notification email was sent
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    #: The number of failed attempts to send the notification email
+    delivery_attempts = models.PositiveSmallIntegerField(default=0)
 
 
 class EmailNotification(Notification):
@@ -159,6 +194,133 @@ class UserNotification(Notification):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE)
 
 
+class ArchivedNotification(models.Model):
+    """
+    Compact record of a notification that has been moved out of the live tables.
+
+    Archived notifications keep just enough information for their follow links to
+    remain resolvable and for auditing. Extra context is not retained.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    class Meta:
+        get_latest_by = "created_at"
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["target_ctype", "target_id"]),
+        ]
+
+    #: The UUID of the original notification
+    uuid = models.UUIDField(unique=True, editable=False)
+    #: The type of the original notification
+    notification_type = models.ForeignKey(NotificationType, models.CASCADE)
+    #: Content type for notification target
+    target_ctype = models.ForeignKey(ContentType, models.CASCADE)
+    #: Object ID for notification target
+    target_id = models.CharField(max_length=250)
+    #: The onward link for the notification
+    link = models.URLField()
+    #: The user that was notified, for user notifications
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE, null=True, blank=True)
+    #: The email that was notified, for email notifications
+    email = models.EmailField(null=True, blank=True)
+    #: Datetime when the original notification was created
+    created_at = models.DateTimeField()
+    #: Datetime at which the notification was followed
+    followed_at = models.DateTimeField(null=True, blank=True)
+    #: Datetime at which the notification was archived
+    archived_at = models.DateTimeField()
+
+
+class PendingFollow(models.Model):
+    """
+    Records a follow of a notification that has not yet been applied to the
+    notification's ``followed_at``.
+
+    This table is append-only from the follow view and is flushed periodically by
+    the ``flushjasminnotificationfollows`` management command.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "link"])]
+
+    #: The notification that was followed
+    #: No database constraint is used so that buffered follows never block deletion
+    #: or archiving of the notification
+    notification = models.ForeignKey(
+        Notification, models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    #: The user that followed the notification, for user notifications
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    #: The link for the followed notification
+    link = models.URLField()
+    #: Datetime at which the notification was followed
+    followed_at = models.DateTimeField(default=timezone.now)
+
+
+class UnreadNotificationCount(models.Model):
+    """
+    Materialised count of the unread notifications that are displayed on site
+    for a user.
+
+    Counts are only maintained if the ``JASMIN_NOTIFICATIONS_UNREAD_COUNTER`` setting
+    is ``True``. Buffered follows are reflected once they have been flushed. The
+    ``reconcilejasminnotificationcounts`` management command recomputes the counts
+    from the notifications.
+    """
+
+    #: The user whose notifications are counted
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, models.CASCADE, primary_key=True, related_name="+"
+    )
+    #: The number of unread, displayable notifications for the user
+    count = models.IntegerField(default=0)
+
+    @classmethod
+    def unread_notifications(cls):
+        """
+        Returns a queryset of the unread notifications that are counted.
+        """
+        return UserNotification.objects.filter(
+            followed_at__isnull=True, notification_type__display=True
+        )
+
+    @classmethod
+    def adjust(cls, user, delta):
+        """
+        Adjusts the count for the given user by ``delta``.
+
+        If the user does not have a count yet, it is computed from the notifications
+        when ``delta`` is positive. Decrements for a user with no count are ignored,
+        as they may happen while the user is being deleted.
+        """
+        if not getattr(settings, "JASMIN_NOTIFICATIONS_UNREAD_COUNTER", False) or not delta:
+            return
+        using = router.db_for_write(cls)
+        updated = cls.objects.using(using).filter(user=user).update(count=models.F("count") + delta)
+        if not updated and delta > 0:
+            _, created = cls.objects.using(using).get_or_create(
+                user=user,
+                defaults={
+                    "count": cls.unread_notifications().using(using).filter(user=user).count()
+                },
+            )
+            # If another transaction created the count first, it could not see our
+            # notifications, so they still need to be added
+            if not created:
+                cls.objects.using(using).filter(user=user).update(count=models.F("count") + delta)
+
+
 class NotifiableUserMixin:
     """
     Mixin that provides notification methods for a user.
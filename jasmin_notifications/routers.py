@@ -0,0 +1,86 @@
+"""
+Database router for the JASMIN notifications app.
+"""
+
+__author__ = "Matt Pryor"
+__copyright__ = "Copyright 2015 UK Science and Technology Facilities Council"
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+
+#: The name of the cookie used to pin a user's notification reads to the primary
+PIN_COOKIE_NAME = "jasmin_notifications_primary"
+
+
+def read_database_alias():
+    """
+    Returns the database alias that notification reads are sent to, or ``None`` if
+    reads are not routed.
+    """
+    return getattr(settings, "JASMIN_NOTIFICATIONS_READ_DATABASE", None)
+
+
+class NotificationRouter:
+    """
+    Database router that sends read-only queries for the notifications app to the
+    database given by the ``JASMIN_NOTIFICATIONS_READ_DATABASE`` setting, e.g. a
+    read replica.
+
+    Writes always go to the default database. Queries for objects related to an
+    instance go to the database the instance was loaded from.
+
+    To use it, add ``"jasmin_notifications.routers.NotificationRouter"`` to
+    ``DATABASE_ROUTERS``.
+    """
+
+    app_label = "jasmin_notifications"
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label or not read_database_alias():
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return read_database_alias()
+
+    def db_for_write(self, model, **hints):
+        # Instances loaded from the replica must still be written to the primary
+        if model._meta.app_label != self.app_label or not read_database_alias():
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        if self.app_label not in {obj1._meta.app_label, obj2._meta.app_label}:
+            return None
+        if not read_database_alias():
+            return None
+        databases = {DEFAULT_DB_ALIAS, read_database_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def pin_to_primary(response):
+    """
+    Sets a short-lived cookie on the response so that the user's notifications are
+    read from the primary database for the next few requests.
+
+    This allows a user to see their own writes, e.g. after following a notification,
+    before they have reached the replica. The number of seconds is given by the
+    ``JASMIN_NOTIFICATIONS_PRIMARY_PIN_SECONDS`` setting (default 10).
+    """
+    seconds = getattr(settings, "JASMIN_NOTIFICATIONS_PRIMARY_PIN_SECONDS", 10)
+    if read_database_alias() and seconds:
+        response.set_cookie(PIN_COOKIE_NAME, "1", max_age=seconds, httponly=True, samesite="Lax")
+    return response
+
+
+def db_for_request(model, request=None):
+    """
+    Returns the database alias to read ``model`` from for the given request, taking
+    into account whether the user has been pinned to the primary.
+    """
+    if request is not None and request.COOKIES.get(PIN_COOKIE_NAME):
+        return router.db_for_write(model)
+    return router.db_for_read(model)
@@ -9,14 +9,23 @@ import logging
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import EmailMessage, send_mail
-from django.db.models import signals
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import send_mail
+from django.db import router, transaction
+from django.db.models import F, signals
 from django.dispatch import receiver
-from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 
-from .helpers import notification_context
-from .models import EmailNotification, Notification, UserNotification
+from .helpers import notification_email
+from .models import (
+    ArchivedNotification,
+    EmailNotification,
+    Notification,
+    PendingFollow,
+    UnreadNotificationCount,
+    UserNotification,
+)
 
 _log = logging.getLogger(__name__)
 
@@ -29,36 +38,76 @@ def send_notification(sender, instance, created, **kwargs):
     The templates at ``jasmin_notifications/mail/{type}/{subject|content}.txt`` are
     rendered for the email subject and body. The context will be as returned by
     :py:func:`~.helpers.notification_context`.
+
+    The email is sent once the transaction that created the notification commits, so
+    no email is sent for a notification that is rolled back and no transaction is held
+    open while talking to the mail server.
+
+    If the ``JASMIN_NOTIFICATIONS_DEFERRED_DELIVERY`` setting is ``True``, no email is
+    sent here and the notification is left for the ``deliverjasminnotifications``
+    management command.
     """
     # Do nothing except for notifications
     if not isinstance(instance, Notification):
         return
     if created:
-        if isinstance(instance, UserNotification):
-            email = instance.user.email
-        else:
-            email = instance.email
-        context = notification_context(instance)
-        template_dir = "jasmin_notifications/mail/{}".format(instance.notification_type.name)
-        subject = render_to_string("{}/subject.txt".format(template_dir), context)
-        subject = (settings.EMAIL_SUBJECT_PREFIX + subject).strip()
-        content = render_to_string("{}/content.txt".format(template_dir), context)
-        message = EmailMessage(
-            subject=subject,
-            body=content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[email],
-            cc=[instance.cc] if isinstance(instance, EmailNotification) and instance.cc else [],
-        )
-        success = message.send(fail_silently=True)
-        if not success:
-            _log.error("Failed to send notification (uuid: {})".format(instance.uuid))
+        if getattr(settings, "JASMIN_NOTIFICATIONS_DEFERRED_DELIVERY", False):
+            return
+        # Notifications created by notify_many are sent together afterwards
+        if getattr(instance, "_defer_delivery", False):
+            return
+        transaction.on_commit(lambda: deliver_notification(instance), using=kwargs["using"])
+
+
+def deliver_notification(notification):
+    """
+    Sends the email for a notification and records the result.
+    """
+    message = notification_email(notification)
+    success = message.send(fail_silently=True)
+    notifications = Notification.objects.filter(pk=notification.pk)
+    if success:
+        notifications.update(delivered_at=timezone.now())
+    else:
+        notifications.update(delivery_attempts=F("delivery_attempts") + 1)
+        _log.error("Failed to send notification (uuid: {})".format(notification.uuid))
 
 
 @receiver(signals.post_delete)
 def delete_notifications(sender, instance, **kwargs):
     """
     When an object is deleted, remove any notifications for it.
+
+    Archived notifications for the object are removed too. This costs one indexed
+    ``EXISTS`` query per deleted object, with the deletion itself only happening if
+    there is something to delete.
     """
+    # The app's own rows are never notification targets
+    if sender in {
+        Notification,
+        UserNotification,
+        EmailNotification,
+        ArchivedNotification,
+        PendingFollow,
+        UnreadNotificationCount,
+    }:
+        return
     EmailNotification.objects.filter_target(instance).delete()
     UserNotification.objects.filter_target(instance).delete()
+    archived = ArchivedNotification.objects.using(router.db_for_write(ArchivedNotification)).filter(
+        target_ctype=ContentType.objects.get_for_model(instance), target_id=instance.pk
+    )
+    # Only go through the deletion collector if there is anything to delete
+    if archived.values("pk").exists():
+        archived.delete()
+
+
+@receiver(signals.post_delete, sender=UserNotification)
+def update_unread_count(sender, instance, **kwargs):
+    """
+    When an unread user notification is deleted, update the user's unread count.
+    """
+    if not getattr(settings, "JASMIN_NOTIFICATIONS_UNREAD_COUNTER", False):
+        return
+    if instance.followed_at is None and instance.notification_type.display:
+        UnreadNotificationCount.adjust(instance.user_id, -1)
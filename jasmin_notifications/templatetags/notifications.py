@@ -6,14 +6,56 @@ __author__ = "Matt Pryor"
 __copyright__ = "Copyright 2015 UK Science and Technology Facilities Council"
 
 from django import template
+from django.conf import settings
+from django.db.models import Exists, OuterRef
 from django.urls import reverse
 
 from ..helpers import notification_context
-from ..models import UserNotification
+from ..models import PendingFollow, UnreadNotificationCount, UserNotification
+from ..routers import db_for_request
 
 register = template.Library()
 
 
+def message_context(notification):
+    """
+    Returns the context for displaying a notification with a pre-rendered message.
+    """
+    return {
+        "notification_type": notification.notification_type.name,
+        "level": notification.notification_type.level,
+        "prerendered_message": notification.message,
+        "follow_link": settings.BASE_URL
+        + reverse("jasmin_notifications:follow", kwargs={"uuid": notification.uuid}),
+        "created_at": notification.created_at,
+        "followed_at": notification.followed_at,
+    }
+
+
+def dropdown_context(notification):
+    """
+    Returns the context for displaying a notification without a pre-rendered message.
+
+    ``prerendered_message`` is only ever set by :py:func:`message_context`, so it is
+    removed in case it was given as extra context.
+    """
+    context = notification_context(notification)
+    context.pop("prerendered_message", None)
+    return context
+
+
+def pending_follow_exists(user):
+    """
+    Returns an expression that is true for notifications of ``user`` that have a
+    buffered follow which is not yet flushed.
+    """
+    return Exists(
+        PendingFollow.objects.filter(
+            user=user, link=OuterRef("link"), followed_at__gte=OuterRef("created_at")
+        )
+    )
+
+
 @register.inclusion_tag("jasmin_notifications/notification_dropdown.html", takes_context=True)
 def notification_dropdown(context):
     """
@@ -24,20 +66,67 @@ def notification_dropdown(context):
     ``jasmin_notifications/messages/{type}.html with the current notification context
     in scope. The context for each notification will be as returned by
     :py:func:`~.helpers.notification_context`.
+
+    Notifications with a pre-rendered message use that message directly, without
+    computing the full notification context.
     """
     # Get the logged in user from the context
     user = context.get("user")
     if user and user.is_authenticated:
         # Get the unread notifications for display for the user
-        notifications = UserNotification.objects.filter(
-            notification_type__display=True, user=user, followed_at__isnull=True
-        ).order_by("-created_at")
+        notifications = (
+            UserNotification.objects.using(db_for_request(UserNotification, context.get("request")))
+            .filter(notification_type__display=True, user=user, followed_at__isnull=True)
+            .select_related("notification_type")
+            .order_by("-created_at")
+        )
+        # Hide notifications whose follows are buffered but not yet flushed
+        if getattr(settings, "JASMIN_NOTIFICATIONS_BUFFER_FOLLOWS", False):
+            notifications = notifications.exclude(pending_follow_exists(user))
     else:
         notifications = []
     # Convert the notifications into a more friendly dict for rendering
-    notifications = [notification_context(n) for n in notifications]
+    notifications = [
+        dropdown_context(n) if n.message is None else message_context(n) for n in notifications
+    ]
     # Add in any extra notifications from the context
     notifications.extend(context.get("notifications_extra", []))
     return {
         "notifications": notifications,
     }
+
+
+@register.simple_tag(takes_context=True)
+def unread_notification_count(context):
+    """
+    Returns the number of unread notifications for the logged in user that are
+    displayed on site, e.g. for rendering a badge.
+
+    If the ``JASMIN_NOTIFICATIONS_UNREAD_COUNTER`` setting is ``True``, this is a
+    lookup of the user's :py:class:`~.models.UnreadNotificationCount`. Otherwise,
+    the notifications are counted.
+
+    As in the dropdown, notifications with a buffered follow that has not been
+    flushed yet are not counted.
+    """
+    user = context.get("user")
+    if not user or not user.is_authenticated:
+        return 0
+    using = db_for_request(UnreadNotificationCount, context.get("request"))
+    unread = UnreadNotificationCount.unread_notifications().using(using).filter(user=user)
+    buffer_follows = getattr(settings, "JASMIN_NOTIFICATIONS_BUFFER_FOLLOWS", False)
+    if getattr(settings, "JASMIN_NOTIFICATIONS_UNREAD_COUNTER", False):
+        count = (
+            UnreadNotificationCount.objects.using(using)
+            .filter(user=user)
+            .values_list("count", flat=True)
+            .first()
+        )
+        if count is not None:
+            # The count only includes buffered follows once they have been flushed
+            if buffer_follows:
+                count = max(count - unread.filter(pending_follow_exists(user)).count(), 0)
+            return count
+    if buffer_follows:
+        unread = unread.exclude(pending_follow_exists(user))
+    return unread.count()
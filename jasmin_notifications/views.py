@@ -8,12 +8,15 @@ __copyright__ = "Copyright 2015 UK Science and Technology Facilities Council"
 import django.shortcuts
 import django.views.decorators.http
 from django import http
+from django.conf import settings
 from django.contrib.auth.decorators import login_not_required
 from django.contrib.auth.views import redirect_to_login
+from django.db import router
 from django.shortcuts import redirect
 from django.utils import timezone
 
-from .models import Notification, UserNotification
+from .models import ArchivedNotification, Notification, PendingFollow, UserNotification
+from .routers import pin_to_primary
 
 
 @login_not_required
@@ -26,11 +29,19 @@ def follow(request, uuid):
 
     Marks all the notifications as read that have the same user and link before
     redirecting to the link.
+
+    If the ``JASMIN_NOTIFICATIONS_BUFFER_FOLLOWS`` setting is ``True``, the follow is
+    recorded as a :py:class:`~.models.PendingFollow` instead, to be applied later by
+    the ``flushjasminnotificationfollows`` management command.
     """
+    buffer_follows = getattr(settings, "JASMIN_NOTIFICATIONS_BUFFER_FOLLOWS", False)
     # First, try to find a notification with the UUID
-    notification = Notification.objects.filter(uuid=uuid).first()
+    # This is read from the primary, as the notification may have only just been created
+    notification = (
+        Notification.objects.using(router.db_for_write(Notification)).filter(uuid=uuid).first()
+    )
     if not notification:
-        raise http.Http404("Notification does not exist")
+        return follow_archived(request, uuid)
     if isinstance(notification, UserNotification):
         # For user notifications, we require an authenticated user
         if not request.user.is_authenticated:
@@ -38,11 +49,21 @@ def follow(request, uuid):
         # The notification must be for the logged-in user
         if request.user != notification.user:
             raise http.Http404("Notification does not exist")
-        # Update the followed_at time for all the notifications for the same user
-        # and link
-        UserNotification.objects.filter(
-            link=notification.link, user=notification.user, followed_at__isnull=True
-        ).update(followed_at=timezone.now())
+        if buffer_follows:
+            PendingFollow.objects.create(
+                notification=notification, user=notification.user, link=notification.link
+            )
+        else:
+            # Update the followed_at time for all the notifications for the same user
+            # and link
+            UserNotification.objects.filter(
+                link=notification.link, user=notification.user
+            ).mark_followed(notification.user, timezone.now())
+        # Make sure the user sees their notification as read on the next page
+        return pin_to_primary(redirect(notification.link))
+    elif buffer_follows:
+        if not notification.followed_at:
+            PendingFollow.objects.create(notification=notification, link=notification.link)
     else:
         # For email notifications, just update this notification
         if not notification.followed_at:
@@ -51,10 +72,32 @@ def follow(request, uuid):
     return redirect(notification.link)
 
 
+def follow_archived(request, uuid):
+    """
+    Follows a notification that has been moved to the archive table.
+
+    This applies the same access checks as :py:func:`follow` and records the follow
+    if the notification was archived without being followed, e.g. an old email
+    notification, before redirecting to the link.
+    """
+    notifications = ArchivedNotification.objects.using(router.db_for_write(ArchivedNotification))
+    notification = notifications.filter(uuid=uuid).first()
+    if not notification:
+        raise http.Http404("Notification does not exist")
+    if notification.user_id:
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.path)
+        if request.user.pk != notification.user_id:
+            raise http.Http404("Notification does not exist")
+    if not notification.followed_at:
+        notifications.filter(pk=notification.pk).update(followed_at=timezone.now())
+    return redirect(notification.link)
+
+
 @django.views.decorators.http.require_POST
 def clear_all(request):
     """Clear all of a user's displayable notifications."""
     UserNotification.objects.filter(
-        user=request.user, followed_at__isnull=True, notification_type__display=True
-    ).update(followed_at=timezone.now())
-    return redirect(request.META.get("HTTP_REFERER", "/"))
+        user=request.user, notification_type__display=True
+    ).mark_followed(request.user, timezone.now())
+    return pin_to_primary(redirect(request.META.get("HTTP_REFERER", "/")))
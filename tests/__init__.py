@@ -0,0 +1,7 @@
+"""
+Tests for the JASMIN notifications app.
+
+Run them from the root of the repository with::
+
+    python -m django test --settings=tests.settings
+"""
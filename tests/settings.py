@@ -0,0 +1,52 @@
+"""
+Minimal Django settings for running the JASMIN notifications tests.
+
+Two in-memory SQLite databases are configured, with ``replica`` standing in for a
+read replica of ``default``. They are not kept in sync, so tests can tell which
+database a query was sent to.
+"""
+
+import pathlib
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent
+
+SECRET_KEY = "jasmin-notifications-tests"
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.humanize",
+    "django.contrib.sessions",
+    "polymorphic",
+    "jasmin_notifications",
+]
+
+MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+]
+
+DATABASES = {
+    "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+    "replica": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+}
+DATABASE_ROUTERS = ["jasmin_notifications.routers.NotificationRouter"]
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [BASE_DIR / "templates"],
+        "APP_DIRS": True,
+    }
+]
+
+ROOT_URLCONF = "tests.urls"
+
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+USE_TZ = True
+
+EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+DEFAULT_FROM_EMAIL = "notifications@example.com"
+BASE_URL = "https://example.com"
+
+JASMIN_NOTIFICATIONS_READ_DATABASE = "replica"
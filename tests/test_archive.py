@@ -0,0 +1,156 @@
+"""
+Tests for archiving notifications with the ``clearjasminnotifications`` command.
+"""
+
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from jasmin_notifications.helpers import notify
+from jasmin_notifications.models import (
+    ArchivedNotification,
+    EmailNotification,
+    Notification,
+    NotificationType,
+    UserNotification,
+)
+
+
+@override_settings(JASMIN_NOTIFICATIONS_READ_DATABASE=None)
+class ArchiveTestCase(TestCase):
+    """
+    Tests for moving notifications into the archive table.
+    """
+
+    def setUp(self):
+        self.notification_type, _ = NotificationType.create("test", level="info")
+        self.hidden_type = NotificationType.objects.create(name="test", level="info", display=False)
+        self.user = get_user_model().objects.create_user("jbloggs", "jbloggs@example.com")
+
+    def age(self, link, days, followed=False):
+        """
+        Make the notification with the given link ``days`` old, optionally followed.
+        """
+        then = timezone.now() - datetime.timedelta(days=days)
+        Notification.objects.filter(link=link).update(
+            created_at=then, followed_at=then if followed else None
+        )
+
+    def archive(self):
+        call_command("clearjasminnotifications", "--archive", stdout=StringIO())
+
+    def test_archive_by_age(self):
+        notify(self.notification_type, self.user, "/followed/", user=self.user)
+        notify(self.notification_type, self.user, "/unread/", user=self.user)
+        notify(self.hidden_type, self.user, "/hidden/", user=self.user)
+        notify(self.notification_type, self.user, "/email/", email="someone@example.com")
+        notify(self.notification_type, self.user, "/recent/", email="someone@example.com")
+        self.age("/followed/", 100, followed=True)
+        self.age("/unread/", 100)
+        self.age("/hidden/", 100)
+        self.age("/email/", 100)
+        self.archive()
+        self.assertEqual(
+            sorted(ArchivedNotification.objects.values_list("link", flat=True)),
+            ["/email/", "/followed/", "/hidden/"],
+        )
+        # Unread notifications that are displayed on site stay in the live tables
+        self.assertEqual(
+            sorted(Notification.objects.values_list("link", flat=True)), ["/recent/", "/unread/"]
+        )
+
+    def test_deleting_notification_skips_archive(self):
+        notify(self.notification_type, self.user, "/link/", user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            Notification.objects.all().delete()
+        self.assertFalse(Notification.objects.exists())
+        archive_table = ArchivedNotification._meta.db_table
+        self.assertFalse([q for q in queries.captured_queries if archive_table in q["sql"]])
+
+    def follow(self, uuid):
+        return self.client.get(reverse("jasmin_notifications:follow", kwargs={"uuid": uuid}))
+
+    def test_archive_copies_notifications(self):
+        notify(self.notification_type, self.user, "/user/", user=self.user)
+        notify(
+            self.notification_type,
+            self.user,
+            "/email/",
+            email="someone@example.com",
+            cc="support@example.com",
+        )
+        self.age("/user/", 100, followed=True)
+        self.age("/email/", 100, followed=True)
+        live = {n.link: n for n in Notification.objects.all()}
+        self.archive()
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(UserNotification.objects.exists())
+        self.assertFalse(EmailNotification.objects.exists())
+        archived = {n.link: n for n in ArchivedNotification.objects.all()}
+        for link, notification in live.items():
+            self.assertEqual(archived[link].uuid, notification.uuid)
+            self.assertEqual(archived[link].notification_type, self.notification_type)
+            self.assertEqual(archived[link].target_ctype, notification.target_ctype)
+            self.assertEqual(archived[link].target_id, str(self.user.pk))
+            self.assertEqual(archived[link].created_at, notification.created_at)
+            self.assertEqual(archived[link].followed_at, notification.followed_at)
+            self.assertIsNotNone(archived[link].archived_at)
+        self.assertEqual(archived["/user/"].user, self.user)
+        self.assertIsNone(archived["/user/"].email)
+        self.assertIsNone(archived["/email/"].user)
+        self.assertEqual(archived["/email/"].email, "someone@example.com")
+
+    def test_archive_in_batches(self):
+        for i in range(5):
+            notify(self.notification_type, self.user, "/link/", email="someone@example.com")
+        self.age("/link/", 100)
+        call_command(
+            "clearjasminnotifications", "--archive", "--batch-size", "2", stdout=StringIO()
+        )
+        self.assertEqual(ArchivedNotification.objects.count(), 5)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_clean_archive(self):
+        notify(self.notification_type, self.user, "/recent/", email="someone@example.com")
+        notify(self.notification_type, self.user, "/old/", email="someone@example.com")
+        self.age("/recent/", 100, followed=True)
+        self.age("/old/", 400, followed=True)
+        self.archive()
+        self.assertEqual(
+            list(ArchivedNotification.objects.values_list("link", flat=True)), ["/recent/"]
+        )
+
+    def test_follow_archived_user_notification(self):
+        notify(self.notification_type, self.user, "/user/", user=self.user)
+        uuid = Notification.objects.get().uuid
+        self.age("/user/", 100, followed=True)
+        self.archive()
+        # Anonymous users must log in first
+        response = self.follow(uuid)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("login", response["Location"])
+        # Other users cannot see the notification
+        other = get_user_model().objects.create_user("other", "other@example.com")
+        self.client.force_login(other)
+        self.assertEqual(self.follow(uuid).status_code, 404)
+        self.client.force_login(self.user)
+        self.assertRedirects(self.follow(uuid), "/user/", fetch_redirect_response=False)
+
+    def test_follow_archived_email_notification(self):
+        notify(self.hidden_type, self.user, "/email/", email="someone@example.com")
+        uuid = Notification.objects.get().uuid
+        self.age("/email/", 100)
+        self.archive()
+        self.assertIsNone(ArchivedNotification.objects.get().followed_at)
+        self.assertRedirects(self.follow(uuid), "/email/", fetch_redirect_response=False)
+        self.assertIsNotNone(ArchivedNotification.objects.get().followed_at)
+
+    def test_follow_unknown_uuid(self):
+        self.assertEqual(self.follow("00000000-0000-0000-0000-000000000000").status_code, 404)
@@ -0,0 +1,139 @@
+"""
+Tests for the unread notification counts.
+"""
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from jasmin_notifications.helpers import notify, notify_many
+from jasmin_notifications.models import (
+    NotificationType,
+    UnreadNotificationCount,
+    UserNotification,
+)
+
+
+@override_settings(
+    JASMIN_NOTIFICATIONS_READ_DATABASE=None, JASMIN_NOTIFICATIONS_UNREAD_COUNTER=True
+)
+class UnreadNotificationCountTestCase(TestCase):
+    """
+    Tests for maintaining and displaying the unread notification counts.
+    """
+
+    def setUp(self):
+        NotificationType.create("test", level="info")
+        self.hidden_type, _ = NotificationType.create("hidden", level="info", display=False)
+        self.user = get_user_model().objects.create_user("jbloggs", "jbloggs@example.com")
+        self.other = get_user_model().objects.create_user("other", "other@example.com")
+
+    def count(self, user=None):
+        return UnreadNotificationCount.objects.get(user=user or self.user).count
+
+    def render_badge(self):
+        template = Template("{% load notifications %}{% unread_notification_count %}")
+        return template.render(Context({"user": self.user}))
+
+    def follow(self, notification):
+        self.client.force_login(self.user)
+        self.client.get(reverse("jasmin_notifications:follow", kwargs={"uuid": notification.uuid}))
+
+    @override_settings(JASMIN_NOTIFICATIONS_BUFFER_FOLLOWS=True)
+    def test_badge_excludes_buffered_follows(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        self.assertEqual(self.render_badge(), "2")
+        self.follow(UserNotification.objects.get(link="/one/"))
+        self.assertEqual(self.render_badge(), "1")
+        # Once flushed, the follow is in the count and must not be subtracted again
+        call_command("flushjasminnotificationfollows", stdout=StringIO())
+        self.assertEqual(self.render_badge(), "1")
+
+    @override_settings(
+        JASMIN_NOTIFICATIONS_BUFFER_FOLLOWS=True, JASMIN_NOTIFICATIONS_UNREAD_COUNTER=False
+    )
+    def test_badge_without_counter_excludes_buffered_follows(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        self.follow(UserNotification.objects.get(link="/one/"))
+        self.assertEqual(self.render_badge(), "1")
+
+    def test_notify_increments(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        self.assertEqual(self.count(), 2)
+
+    def test_hidden_and_email_notifications_not_counted(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify(self.hidden_type, self.user, "/hidden/", user=self.user)
+        notify("test", self.user, "/email/", email="jbloggs@example.com")
+        self.assertEqual(self.count(), 1)
+
+    def test_notify_many_increments(self):
+        notify_many("test", self.user, "/one/", users=[self.user, self.other])
+        notify_many("test", self.user, "/two/", users=[self.user])
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.count(self.other), 1)
+
+    def test_first_increment_counts_existing(self):
+        with self.settings(JASMIN_NOTIFICATIONS_UNREAD_COUNTER=False):
+            notify("test", self.user, "/one/", user=self.user)
+        self.assertFalse(UnreadNotificationCount.objects.exists())
+        notify("test", self.user, "/two/", user=self.user)
+        self.assertEqual(self.count(), 2)
+
+    def test_follow_decrements(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        self.follow(UserNotification.objects.filter(link="/one/").first())
+        self.assertEqual(self.count(), 1)
+        # Following again does not decrement again
+        self.follow(UserNotification.objects.filter(link="/one/").first())
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(self.render_badge(), "1")
+
+    def test_clear_all(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        notify(self.hidden_type, self.user, "/hidden/", user=self.user)
+        notify("test", self.other, "/one/", user=self.other)
+        self.client.force_login(self.user)
+        self.client.post(reverse("jasmin_notifications:clear_all"))
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(self.count(self.other), 1)
+
+    def test_delete_decrements_unread(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        notify("test", self.user, "/three/", user=self.user)
+        self.follow(UserNotification.objects.get(link="/two/"))
+        self.assertEqual(self.count(), 2)
+        UserNotification.objects.filter(link__in=["/one/", "/two/"]).delete()
+        self.assertEqual(self.count(), 1)
+
+    def test_deleting_target_decrements(self):
+        notify("test", self.other, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        self.other.delete()
+        self.assertEqual(self.count(), 1)
+
+    def test_reconcile(self):
+        notify("test", self.user, "/one/", user=self.user)
+        notify("test", self.user, "/two/", user=self.user)
+        notify("test", self.other, "/one/", user=self.other)
+        third = get_user_model().objects.create_user("third", "third@example.com")
+        with self.settings(JASMIN_NOTIFICATIONS_UNREAD_COUNTER=False):
+            notify("test", third, "/one/", user=third)
+        UnreadNotificationCount.objects.filter(user=self.user).update(count=10)
+        UserNotification.objects.filter(user=self.other).update(followed_at=timezone.now())
+        call_command("reconcilejasminnotificationcounts", "--batch-size", "1", stdout=StringIO())
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.count(self.other), 0)
+        self.assertEqual(self.count(third), 1)
@@ -0,0 +1,99 @@
+"""
+Tests for delivering notification emails with ``deliverjasminnotifications``.
+
+The command runs its workers in threads, which cannot see the data of a test
+transaction, so batches are delivered by calling ``deliver_batch`` directly.
+"""
+
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jasmin_notifications.helpers import notify
+from jasmin_notifications.management.commands.deliverjasminnotifications import Command
+from jasmin_notifications.models import Notification, NotificationType
+
+
+class FailingEmailBackend(EmailBackend):
+    """
+    Email backend that fails to send every message.
+    """
+
+    def send_messages(self, messages):
+        return 0
+
+
+@override_settings(
+    JASMIN_NOTIFICATIONS_READ_DATABASE=None, JASMIN_NOTIFICATIONS_DEFERRED_DELIVERY=True
+)
+class DeliveryTestCase(TestCase):
+    """
+    Tests for claiming notifications and recording their delivery.
+    """
+
+    def setUp(self):
+        NotificationType.create("test", level="info")
+        self.user = get_user_model().objects.create_user("jbloggs", "jbloggs@example.com")
+        self.command = Command()
+
+    def create(self, count):
+        for i in range(count):
+            notify("test", self.user, "/link/{}/".format(i), email="e{}@example.com".format(i))
+        return list(Notification.objects.order_by("id"))
+
+    def deliver(self, connection=None, batch_size=10, max_attempts=5, grace_seconds=300):
+        return self.command.deliver_batch(
+            "default",
+            connection or EmailBackend(),
+            batch_size,
+            self.command.claimable(max_attempts, grace_seconds),
+        )
+
+    def test_delivers_in_batches(self):
+        self.create(3)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(self.deliver(batch_size=2), (2, 0))
+        self.assertEqual(self.deliver(batch_size=2), (1, 0))
+        self.assertIsNone(self.deliver(batch_size=2))
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            ["e0@example.com", "e1@example.com", "e2@example.com"],
+        )
+        self.assertFalse(Notification.objects.filter(delivered_at__isnull=True).exists())
+
+    def test_failures_are_retried_until_max_attempts(self):
+        self.create(1)
+        self.assertEqual(self.deliver(FailingEmailBackend(), max_attempts=2), (0, 1))
+        notification = Notification.objects.get()
+        self.assertIsNone(notification.delivered_at)
+        self.assertEqual(notification.delivery_attempts, 1)
+        self.assertEqual(self.deliver(FailingEmailBackend(), max_attempts=2), (0, 1))
+        self.assertEqual(Notification.objects.get().delivery_attempts, 2)
+        # The notification has now used up its attempts
+        self.assertIsNone(self.deliver(max_attempts=2))
+        self.assertEqual(self.deliver(max_attempts=3), (1, 0))
+        self.assertIsNotNone(Notification.objects.get().delivered_at)
+
+    def test_failed_notifications_are_claimed_last(self):
+        first, second = self.create(2)
+        Notification.objects.filter(pk=first.pk).update(delivery_attempts=1)
+        self.assertEqual(self.deliver(batch_size=1), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ["e1@example.com"])
+
+    @override_settings(JASMIN_NOTIFICATIONS_DEFERRED_DELIVERY=False)
+    def test_grace_window_without_deferred_delivery(self):
+        # The emails are sent on commit, which never happens in a test case
+        fresh, failed, old = self.create(3)
+        Notification.objects.filter(pk=failed.pk).update(delivery_attempts=1)
+        Notification.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - datetime.timedelta(minutes=10)
+        )
+        # Notifications that may still be being sent inline are left alone
+        self.assertEqual(self.deliver(), (2, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["e1@example.com", "e2@example.com"])
+        self.assertIsNone(Notification.objects.get(pk=fresh.pk).delivered_at)
+        self.assertEqual(self.deliver(grace_seconds=0), (1, 0))
@@ -0,0 +1,64 @@
+"""
+Tests for the ``exportjasminnotifications`` command.
+"""
+
+import csv
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jasmin_notifications.helpers import notify
+from jasmin_notifications.models import Notification, NotificationType
+
+
+@override_settings(JASMIN_NOTIFICATIONS_READ_DATABASE=None)
+class ExportTestCase(TestCase):
+    """
+    Tests for exporting live and archived notifications.
+    """
+
+    def setUp(self):
+        NotificationType.create("test", level="info")
+        self.user = get_user_model().objects.create_user("jbloggs", "jbloggs@example.com")
+        notify("test", self.user, "/archived/", user=self.user)
+        notify("test", self.user, "/live/", user=self.user)
+        notify("test", self.user, "/email/", email="someone@example.com")
+        self.followed_at = timezone.now().replace(microsecond=123456) - datetime.timedelta(days=100)
+        Notification.objects.filter(link="/archived/").update(followed_at=self.followed_at)
+        call_command("clearjasminnotifications", "--archive", stdout=StringIO())
+
+    def export(self, *args):
+        stdout = StringIO()
+        call_command("exportjasminnotifications", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_export_includes_archived(self):
+        rows = list(csv.DictReader(StringIO(self.export("--user", "jbloggs"))))
+        self.assertEqual([row["link"] for row in rows], ["/live/", "/archived/"])
+        self.assertEqual(rows[0]["archived_at"], "")
+        self.assertNotEqual(rows[1]["archived_at"], "")
+        self.assertEqual(rows[1]["email"], "jbloggs@example.com")
+
+    def test_export_exclude_archived(self):
+        rows = list(csv.DictReader(StringIO(self.export("--exclude-archived"))))
+        self.assertEqual([row["link"] for row in rows], ["/live/", "/email/"])
+
+    def test_export_filters_archived_by_email(self):
+        output = self.export("--email", "jbloggs@example.com", "--format", "jsonl")
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([row["link"] for row in rows], ["/live/", "/archived/"])
+
+    def test_datetimes_keep_microseconds(self):
+        expected = self.followed_at.isoformat()
+        csv_rows = list(csv.DictReader(StringIO(self.export("--user", "jbloggs"))))
+        jsonl_rows = [
+            json.loads(line)
+            for line in self.export("--user", "jbloggs", "--format", "jsonl").splitlines()
+        ]
+        self.assertEqual(csv_rows[1]["followed_at"], expected)
+        self.assertEqual(jsonl_rows[1]["followed_at"], expected)
@@ -0,0 +1,127 @@
+"""
+Tests for buffering follows and applying them with ``flushjasminnotificationfollows``.
+"""
+
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from jasmin_notifications.helpers import notify
+from jasmin_notifications.models import (
+    EmailNotification,
+    Notification,
+    NotificationType,
+    PendingFollow,
+    UserNotification,
+)
+
+
+@override_settings(
+    JASMIN_NOTIFICATIONS_READ_DATABASE=None, JASMIN_NOTIFICATIONS_BUFFER_FOLLOWS=True
+)
+class BufferedFollowTestCase(TestCase):
+    """
+    Tests for buffered follows.
+    """
+
+    def setUp(self):
+        NotificationType.create("test", level="info")
+        self.user = get_user_model().objects.create_user("jbloggs", "jbloggs@example.com")
+        self.now = timezone.now()
+
+    def create(self, link, minutes_ago, **kwargs):
+        """
+        Create a notification for the link that was created the given minutes ago.
+        """
+        kwargs.setdefault("user", self.user)
+        notify("test", self.user, link, **kwargs)
+        notification = Notification.objects.latest("id")
+        created_at = self.now - datetime.timedelta(minutes=minutes_ago)
+        Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+        notification.created_at = created_at
+        return notification
+
+    def buffer(self, notification, minutes_ago, user=None):
+        """
+        Buffer a follow of the notification from the given minutes ago.
+        """
+        return PendingFollow.objects.create(
+            notification=notification,
+            user=user,
+            link=notification.link,
+            followed_at=self.now - datetime.timedelta(minutes=minutes_ago),
+        )
+
+    def flush(self):
+        call_command("flushjasminnotificationfollows", stdout=StringIO())
+
+    def followed_at(self, notification):
+        return Notification.objects.get(pk=notification.pk).followed_at
+
+    def render_dropdown(self):
+        template = Template("{% load notifications %}{% notification_dropdown %}")
+        return template.render(Context({"user": self.user}))
+
+    def test_follow_is_buffered(self):
+        notification = self.create("/link/", 10)
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("jasmin_notifications:follow", kwargs={"uuid": notification.uuid})
+        )
+        self.assertRedirects(response, "/link/", fetch_redirect_response=False)
+        self.assertIsNone(self.followed_at(notification))
+        self.assertEqual(PendingFollow.objects.get().notification_id, notification.pk)
+        self.flush()
+        self.assertIsNotNone(self.followed_at(notification))
+        self.assertFalse(PendingFollow.objects.exists())
+
+    def test_user_follows_use_latest_follow(self):
+        first = self.create("/link/", 30)
+        second = self.create("/link/", 20)
+        other = self.create("/other/", 30)
+        self.buffer(first, 25, self.user)
+        self.buffer(second, 15, self.user)
+        self.flush()
+        latest = self.now - datetime.timedelta(minutes=15)
+        self.assertEqual(self.followed_at(first), latest)
+        self.assertEqual(self.followed_at(second), latest)
+        self.assertIsNone(self.followed_at(other))
+
+    def test_user_follows_skip_later_notifications(self):
+        followed = self.create("/link/", 30)
+        later = self.create("/link/", 5)
+        self.buffer(followed, 10, self.user)
+        self.flush()
+        self.assertEqual(self.followed_at(followed), self.now - datetime.timedelta(minutes=10))
+        # The notification was created after the follow, so was never seen
+        self.assertIsNone(self.followed_at(later))
+
+    def test_email_follows_use_first_follow(self):
+        first = self.create("/link/", 30, user=None, email="someone@example.com")
+        second = self.create("/link/", 30, user=None, email="other@example.com")
+        self.buffer(first, 20)
+        self.buffer(first, 10)
+        self.buffer(second, 5)
+        self.flush()
+        self.assertEqual(self.followed_at(first), self.now - datetime.timedelta(minutes=20))
+        self.assertEqual(self.followed_at(second), self.now - datetime.timedelta(minutes=5))
+        self.assertEqual(EmailNotification.objects.filter(followed_at__isnull=True).count(), 0)
+
+    def test_dropdown_hides_buffered_follows(self):
+        followed = self.create("/link/", 30)
+        self.buffer(followed, 10, self.user)
+        self.assertNotIn("https://example.com/notifications/", self.render_dropdown())
+        # A notification for the same link created after the follow is shown
+        later = self.create("/link/", 5)
+        self.assertIn(str(later.uuid), self.render_dropdown())
+        self.assertNotIn(str(followed.uuid), self.render_dropdown())
+        self.flush()
+        self.assertIn(str(later.uuid), self.render_dropdown())
+        self.assertNotIn(str(followed.uuid), self.render_dropdown())
+        self.assertEqual(UserNotification.objects.filter(followed_at__isnull=True).get(), later)
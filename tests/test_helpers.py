@@ -0,0 +1,64 @@
+"""
+Tests for creating notifications and sending their emails.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from jasmin_notifications.helpers import notify, notify_many
+from jasmin_notifications.models import NotificationType
+
+
+@override_settings(JASMIN_NOTIFICATIONS_READ_DATABASE=None)
+class NotifyTestCase(TestCase):
+    """
+    Tests for the notify helpers.
+    """
+
+    def setUp(self):
+        NotificationType.create("test", level="info")
+        user_model = get_user_model()
+        self.users = [
+            user_model.objects.create_user("user{}".format(i), "user{}@example.com".format(i))
+            for i in range(2)
+        ]
+
+    def test_notify_sends_to_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify("test", self.users[0], "/link/", user=self.users[0], email="other@example.com")
+        self.assertEqual([m.to for m in mail.outbox], [["user0@example.com"]])
+
+    def test_notify_many_sends_to_recipients(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_many(
+                "test",
+                self.users[0],
+                "/link/",
+                users=self.users,
+                emails=["someone@example.com"],
+                email="other@example.com",
+            )
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            ["someone@example.com", "user0@example.com", "user1@example.com"],
+        )
+
+    def test_notify_many_sends_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify_many("test", self.users[0], "/link/", users=self.users)
+        self.assertEqual(len(mail.outbox), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_notify_many_rolled_back_sends_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    notify_many("test", self.users[0], "/link/", users=self.users)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(len(mail.outbox), 0)
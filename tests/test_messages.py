@@ -0,0 +1,45 @@
+"""
+Tests for pre-rendered on-site notification messages.
+"""
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from jasmin_notifications.helpers import notify
+from jasmin_notifications.models import Notification, NotificationType
+
+
+@override_settings(JASMIN_NOTIFICATIONS_READ_DATABASE=None)
+class RenderMessagesTestCase(TestCase):
+    """
+    Tests for the ``renderjasminnotifications`` command.
+    """
+
+    def setUp(self):
+        NotificationType.create("test", level="info")
+        self.user = get_user_model().objects.create_user("jbloggs", "jbloggs@example.com")
+        with self.settings(JASMIN_NOTIFICATIONS_PRERENDER_MESSAGES=True):
+            notify("test", self.user, "/rendered/", user=self.user)
+        notify("test", self.user, "/unrendered/", user=self.user)
+        Notification.objects.update(message="old")
+        Notification.objects.filter(link="/unrendered/").update(message=None)
+
+    def render(self, *args):
+        call_command("renderjasminnotifications", *args, stdout=StringIO())
+        return dict(Notification.objects.values_list("link", "message"))
+
+    def test_rerenders_stored_messages_only(self):
+        messages = self.render()
+        self.assertEqual(messages["/rendered/"], "Test message for jbloggs\n")
+        self.assertIsNone(messages["/unrendered/"])
+
+    def test_unrendered(self):
+        messages = self.render("--unrendered")
+        self.assertEqual(messages["/unrendered/"], "Test message for jbloggs\n")
+
+    def test_clear(self):
+        messages = self.render("--clear")
+        self.assertEqual(messages, {"/rendered/": None, "/unrendered/": None})
@@ -0,0 +1,83 @@
+"""
+Tests for routing notification queries between the primary and a read replica.
+"""
+
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import router
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from jasmin_notifications.helpers import notify
+from jasmin_notifications.models import Notification, NotificationType, UserNotification
+from jasmin_notifications.routers import PIN_COOKIE_NAME
+
+
+class NotificationRouterTestCase(TestCase):
+    """
+    Tests for the notification router and the views and template tags that use it.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        notification_type, _ = NotificationType.create("test", level="info")
+        # Notification types are looked up on the replica, so they must be replicated
+        notification_type.save(using="replica")
+        self.user = get_user_model().objects.create_user("jbloggs", "jbloggs@example.com")
+        notify("test", self.user, "https://example.com/target/", user=self.user)
+        # The notification has only been written to the primary
+        self.notification = UserNotification.objects.using("default").get()
+
+    def render_dropdown(self, request):
+        template = Template("{% load notifications %}{% notification_dropdown %}")
+        return template.render(Context({"user": self.user, "request": request}))
+
+    def test_reads_use_replica(self):
+        self.assertEqual(router.db_for_read(Notification), "replica")
+        self.assertFalse(UserNotification.objects.exists())
+        # Models from other apps are not routed
+        self.assertEqual(router.db_for_read(get_user_model()), "default")
+
+    def test_writes_use_primary(self):
+        self.assertEqual(router.db_for_write(Notification), "default")
+        self.assertEqual(self.notification._state.db, "default")
+        self.assertFalse(UserNotification.objects.using("replica").exists())
+
+    def test_follow_uses_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("jasmin_notifications:follow", kwargs={"uuid": self.notification.uuid})
+        )
+        # The notification is not on the replica, so this would be a 404 if the
+        # lookup was not sent to the primary
+        self.assertRedirects(response, "https://example.com/target/", fetch_redirect_response=False)
+        self.notification.refresh_from_db(using="default")
+        self.assertIsNotNone(self.notification.followed_at)
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_pin_cookie_uses_primary_for_dropdown(self):
+        request = RequestFactory().get("/")
+        self.assertNotIn("Test message for jbloggs", self.render_dropdown(request))
+        request.COOKIES[PIN_COOKIE_NAME] = "1"
+        self.assertIn("Test message for jbloggs", self.render_dropdown(request))
+
+    def test_deleting_target_deletes_notifications_on_primary(self):
+        group = Group.objects.create(name="group")
+        notify("test", group, "https://example.com/group/", user=self.user)
+        notifications = UserNotification.objects.using("default")
+        pk = notifications.filter_target(group).get().pk
+        group.delete()
+        self.assertFalse(notifications.filter(pk=pk).exists())
+
+    def test_clear_deletes_on_primary(self):
+        UserNotification.objects.using("default").update(
+            followed_at=timezone.now() - datetime.timedelta(days=400)
+        )
+        call_command("clearjasminnotifications")
+        self.assertFalse(UserNotification.objects.using("default").exists())
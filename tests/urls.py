@@ -0,0 +1,9 @@
+"""
+URL configuration for the JASMIN notifications tests.
+"""
+
+import django.urls
+
+urlpatterns = [
+    django.urls.path("notifications/", django.urls.include("jasmin_notifications.urls")),
+]